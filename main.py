@@ -1,5 +1,15 @@
 import subprocess
 
+try:
+    from Quartz import (
+        CGWindowListCopyWindowInfo,
+        kCGNullWindowID,
+        kCGWindowListExcludeDesktopElements,
+        kCGWindowListOptionOnScreenOnly,
+    )
+except ImportError:  # pyobjc not installed: fall back to osascript
+    CGWindowListCopyWindowInfo = None
+
 script = '''
 tell application "System Events"
     set windowList to ""
@@ -13,5 +23,26 @@ tell application "System Events"
 end tell
 return windowList
 '''
-res = subprocess.run(["osascript", "-e", script], capture_output=True, text=True)
-print(res.stdout)
+
+def _osascript_window_names() -> str:
+    res = subprocess.run(["osascript", "-e", script], capture_output=True, text=True)
+    return res.stdout
+
+def list_window_names() -> str:
+    """Newline-separated names of on-screen application windows.
+
+    Uses Quartz (pyobjc) when available. On macOS 10.15+ Quartz only reports
+    other apps' window names with the Screen Recording permission, so fall
+    back to osascript when it yields none.
+    """
+    if CGWindowListCopyWindowInfo is None:
+        return _osascript_window_names()
+    opts = kCGWindowListOptionOnScreenOnly | kCGWindowListExcludeDesktopElements
+    names = []
+    for w in CGWindowListCopyWindowInfo(opts, kCGNullWindowID):
+        name = w.get("kCGWindowName", "")
+        if name and w.get("kCGWindowLayer", 0) == 0:
+            names.append(name + "\n")
+    return "".join(names) or _osascript_window_names()
+
+print(list_window_names())
@@ -1,12 +1,18 @@
 # activity_lib.py
 # Windows-only helpers for activity snapshots + visible window listing.
 # psutil is required (for CPU and network metrics).
+# Not thread-safe: the window/process helpers share module-level buffers and
+# caches, so call them from a single thread. The background sampler thread
+# only touches psutil and _LAST_RATES.
 
 import ctypes
 import time
 import shutil
+import sys
+import threading
 import psutil
-from typing import List, Tuple
+from operator import itemgetter
+from typing import Dict, List, Set, Tuple
 from ctypes import wintypes
 
 # --- WinAPI setup ---
@@ -18,7 +24,14 @@ GetLastInputInfo = user32.GetLastInputInfo
 GetForegroundWindow = user32.GetForegroundWindow
 GetWindowTextLengthW = user32.GetWindowTextLengthW
 GetWindowTextW = user32.GetWindowTextW
-GetTickCount = ctypes.windll.kernel32.GetTickCount
+GetTickCount = kernel32.GetTickCount
+
+GetTickCount.argtypes = []
+GetTickCount.restype = wintypes.DWORD
+GetWindowTextLengthW.argtypes = [wintypes.HWND]
+GetWindowTextLengthW.restype = ctypes.c_int
+GetWindowTextW.argtypes = [wintypes.HWND, wintypes.LPWSTR, ctypes.c_int]
+GetWindowTextW.restype = ctypes.c_int
 
 class LASTINPUTINFO(ctypes.Structure):
     _fields_ = [
@@ -26,40 +39,88 @@ class LASTINPUTINFO(ctypes.Structure):
         ("dwTime", wintypes.DWORD)
     ]
 
+GetLastInputInfo.argtypes = [ctypes.POINTER(LASTINPUTINFO)]
+GetLastInputInfo.restype = wintypes.BOOL
+GetForegroundWindow.argtypes = []
+GetForegroundWindow.restype = wintypes.HWND
+
+# Reused by get_idle_seconds; cbSize only needs setting once.
+_LII = LASTINPUTINFO()
+_LII.cbSize = ctypes.sizeof(LASTINPUTINFO)
+_LII_REF = ctypes.byref(_LII)
+
 # Window enumeration-related API calls
 EnumWindows = user32.EnumWindows
 EnumWindowsProc = ctypes.WINFUNCTYPE(ctypes.c_bool, wintypes.HWND, wintypes.LPARAM)
 IsWindowVisible = user32.IsWindowVisible
 GetWindowThreadProcessId = user32.GetWindowThreadProcessId
 
+EnumWindows.argtypes = [EnumWindowsProc, wintypes.LPARAM]
+EnumWindows.restype = wintypes.BOOL
+IsWindowVisible.argtypes = [wintypes.HWND]
+IsWindowVisible.restype = wintypes.BOOL
+GetWindowThreadProcessId.argtypes = [wintypes.HWND, wintypes.LPDWORD]
+GetWindowThreadProcessId.restype = wintypes.DWORD
+
+GetWindow = user32.GetWindow
+GetWindow.argtypes = [wintypes.HWND, wintypes.UINT]
+GetWindow.restype = wintypes.HWND
+GetWindowLongW = user32.GetWindowLongW
+GetWindowLongW.argtypes = [wintypes.HWND, ctypes.c_int]
+GetWindowLongW.restype = wintypes.LONG
+
+# Out-parameter reused by every GetWindowThreadProcessId call.
+_PID = wintypes.DWORD()
+_PID_REF = ctypes.byref(_PID)
+
+GW_OWNER = 4
+GWL_EXSTYLE = -20
+WS_EX_TOOLWINDOW = 0x00000080
+
 PROCESS_QUERY_LIMITED_INFORMATION = 0x1000
 QueryFullProcessImageNameW = getattr(kernel32, "QueryFullProcessImageNameW", None)
 OpenProcess = kernel32.OpenProcess
 CloseHandle = kernel32.CloseHandle
 
+OpenProcess.argtypes = [wintypes.DWORD, wintypes.BOOL, wintypes.DWORD]
+OpenProcess.restype = wintypes.HANDLE
+CloseHandle.argtypes = [wintypes.HANDLE]
+CloseHandle.restype = wintypes.BOOL
+if QueryFullProcessImageNameW:
+    QueryFullProcessImageNameW.argtypes = [wintypes.HANDLE, wintypes.DWORD, wintypes.LPWSTR,
+                                           ctypes.POINTER(wintypes.DWORD)]
+    QueryFullProcessImageNameW.restype = wintypes.BOOL
+
+# Reused for every title read; longer titles take the slow path.
+_TITLE_BUF_LEN = 512
+_TITLE_BUF = ctypes.create_unicode_buffer(_TITLE_BUF_LEN)
+# Reused for every image-path query; 32767 wchars is the extended-path limit.
+_PATH_BUF = ctypes.create_unicode_buffer(32768)
+# pid -> process name for list_visible_windows only; pruned to the PIDs seen
+# in the latest enumeration.
+_PROCESS_NAME_CACHE: Dict[int, str] = {}
+
+# Background CPU/network sampler state (see start_sampler).
+SAMPLER_SECONDS = 1.0
+_LAST_RATES = {"cpu_percent": 0.0, "net_up_bps": 0.0, "net_down_bps": 0.0}
+_SAMPLER_READY = threading.Event()
+_SAMPLER_LOCK = threading.Lock()
+_sampler_thread: threading.Thread | None = None
+
 # ---------------- Activity (idle, foreground, cpu/net) ----------------
 
 def get_idle_seconds() -> float:
     """Seconds since last keyboard/mouse input."""
-    lii = LASTINPUTINFO()
-    lii.cbSize = ctypes.sizeof(LASTINPUTINFO)
-    if not GetLastInputInfo(ctypes.byref(lii)):
+    if not GetLastInputInfo(_LII_REF):
         return -1.0
-    tick_now = GetTickCount()
-    elapsed_ms = (tick_now - lii.dwTime) & 0xFFFFFFFF
-    return elapsed_ms / 1000.0
+    return ((GetTickCount() - _LII.dwTime) & 0xFFFFFFFF) * 0.001
 
 def get_foreground_title() -> str:
     """Title of the current foreground window."""
     hwnd = GetForegroundWindow()
     if not hwnd:
         return ""
-    length = GetWindowTextLengthW(hwnd)
-    if length <= 0:
-        return ""
-    buf = ctypes.create_unicode_buffer(length + 1)
-    GetWindowTextW(hwnd, buf, length + 1)
-    return buf.value
+    return get_window_title(hwnd)
 
 def get_cpu_percent(sample_seconds: float = 1.0) -> float:
     """CPU % over a short interval."""
@@ -76,12 +137,19 @@ def get_net_rates(sample_seconds: float = 1.0) -> Tuple[float, float]:
     down = (c1.bytes_recv - c0.bytes_recv) / sample_seconds
     return up, down
 
+_RATE_UNITS = ("KB/s", "MB/s", "GB/s")
+
 def human_rate(bps: float) -> str:
-    """Human-friendly KB/s or MB/s string."""
-    kb = bps / 1024.0
-    if kb < 1024:
-        return f"{kb:,.1f} KB/s"
-    return f"{kb/1024.0:,.2f} MB/s"
+    """Human-friendly KB/s, MB/s or GB/s string."""
+    v = bps / 1024.0
+    i = 0
+    if v >= 1024.0:
+        v /= 1024.0
+        i = 1
+    if v >= 1024.0:
+        v /= 1024.0
+        i = 2
+    return f"{v:,.2f} {_RATE_UNITS[i]}"
 
 def truncate(s: str, max_len: int) -> str:
     return s if len(s) <= max_len else s[: max_len - 1] + "…"
@@ -90,23 +158,77 @@ def print_table(rows: List[Tuple[str, str]]) -> None:
     """Simple two-column table that fits the terminal width."""
     term_width = shutil.get_terminal_size((80, 20)).columns
     key_w = max(len(k) for k, _ in rows) + 2
+    available = max(10, term_width - key_w)
+    out = []
     for k, v in rows:
         val = str(v)
-        available = max(10, term_width - key_w)
-        print(f"{k:<{key_w}}{truncate(val, available)}")
+        out.append(f"{k:<{key_w}}{truncate(val, available)}\n")
+    sys.stdout.write("".join(out))
+    sys.stdout.flush()
+
+def _cpu_busy_total(t) -> Tuple[float, float]:
+    """(busy, total) CPU seconds from a psutil.cpu_times() result."""
+    total = sum(t)
+    return total - t.idle, total
+
+def _sampler() -> None:
+    """Refresh _LAST_RATES forever; runs on the daemon sampler thread.
+
+    CPU and network counters are read back-to-back once per tick, and each
+    tick's reading doubles as the next tick's baseline.
+    """
+    global _LAST_RATES
+    busy0, total0 = _cpu_busy_total(psutil.cpu_times())
+    c0 = psutil.net_io_counters()
+    t0 = time.monotonic()
+    while True:
+        time.sleep(SAMPLER_SECONDS)
+        busy1, total1 = _cpu_busy_total(psutil.cpu_times())
+        c1 = psutil.net_io_counters()
+        t1 = time.monotonic()
+        d_total = total1 - total0
+        cpu = min(100.0, max(0.0, 100.0 * (busy1 - busy0) / d_total)) if d_total > 0 else 0.0
+        dt = t1 - t0
+        # Rebind rather than mutate so readers always see a consistent dict.
+        _LAST_RATES = {
+            "cpu_percent": cpu,
+            "net_up_bps": (c1.bytes_sent - c0.bytes_sent) / dt,
+            "net_down_bps": (c1.bytes_recv - c0.bytes_recv) / dt,
+        }
+        _SAMPLER_READY.set()
+        busy0, total0, c0, t0 = busy1, total1, c1, t1
+
+def start_sampler() -> None:
+    """Start the background CPU/network sampler, or restart it if it has died."""
+    global _sampler_thread
+    with _SAMPLER_LOCK:
+        if _sampler_thread is None or not _sampler_thread.is_alive():
+            # A restarted sampler must not serve the dead one's stale rates.
+            _SAMPLER_READY.clear()
+            _sampler_thread = threading.Thread(target=_sampler, name="time32-sampler", daemon=True)
+            _sampler_thread.start()
 
 def build_activity_snapshot(cpu_seconds: float = 0.8, net_seconds: float = 0.2) -> dict:
-    """Build a one-shot activity snapshot dict."""
-    cpu = get_cpu_percent(sample_seconds=cpu_seconds)
-    up_bps, down_bps = get_net_rates(sample_seconds=net_seconds)
+    """Build a one-shot activity snapshot dict.
+
+    CPU and network rates come from the background sampler, so this only
+    blocks while a (re)started sampler takes its first sample.
+    cpu_seconds and net_seconds are accepted for compatibility and ignored;
+    the sampling window is SAMPLER_SECONDS.
+    """
+    start_sampler()
+    _SAMPLER_READY.wait(SAMPLER_SECONDS * 2)
+    rates = _LAST_RATES
     idle = get_idle_seconds()
-    title = get_foreground_title() or "(no title / none)"
+    hwnd = GetForegroundWindow()
+    title = (get_window_title(hwnd) if hwnd else "") or "(no title / none)"
     return {
         "idle_seconds": idle,
+        "foreground_hwnd": hwnd,
         "foreground_title": title,
-        "cpu_percent": cpu,
-        "net_up_bps": up_bps,
-        "net_down_bps": down_bps,
+        "cpu_percent": rates["cpu_percent"],
+        "net_up_bps": rates["net_up_bps"],
+        "net_down_bps": rates["net_down_bps"],
         "timestamp": time.time(),
     }
 
@@ -125,17 +247,19 @@ def print_activity_snapshot(snapshot: dict | None = None) -> None:
 # ---------------- Window enumeration ----------------
 
 def get_window_title(hwnd: int) -> str:
+    """Window title, read in one call for anything that fits _TITLE_BUF."""
+    n = GetWindowTextW(hwnd, _TITLE_BUF, _TITLE_BUF_LEN)
+    if n < _TITLE_BUF_LEN - 1:
+        return _TITLE_BUF[:n]
+    # Possibly truncated: fall back to sizing the buffer exactly.
     length = GetWindowTextLengthW(hwnd)
-    if length == 0:
-        return ""
     buf = ctypes.create_unicode_buffer(length + 1)
-    GetWindowTextW(hwnd, buf, length + 1)
-    return buf.value
+    n = GetWindowTextW(hwnd, buf, length + 1)
+    return buf[:n]
 
 def get_window_pid(hwnd: int) -> int:
-    pid = wintypes.DWORD()
-    GetWindowThreadProcessId(hwnd, ctypes.byref(pid))
-    return pid.value
+    GetWindowThreadProcessId(hwnd, _PID_REF)
+    return _PID.value
 
 def get_process_name(pid: int) -> str:
     """Process name using WinAPI."""
@@ -145,44 +269,81 @@ def get_process_name(pid: int) -> str:
     if not hProcess:
         return ""
     try:
-        size = wintypes.DWORD(260)
-        buf = ctypes.create_unicode_buffer(size.value)
-        if QueryFullProcessImageNameW(hProcess, 0, buf, ctypes.byref(size)):
-            path = buf.value
+        size = wintypes.DWORD(len(_PATH_BUF))
+        if QueryFullProcessImageNameW(hProcess, 0, _PATH_BUF, ctypes.byref(size)):
+            path = _PATH_BUF.value
             return path.split("\\")[-1]
         return ""
     finally:
         CloseHandle(hProcess)
 
-def list_visible_windows() -> List[Tuple[int, str, int, str]]:
-    """Return a list of (hwnd, title, pid, process_name) for visible top-level windows."""
-    windows: List[Tuple[int, str, int, str]] = []
-
-    def callback(hwnd, lparam):
-        if IsWindowVisible(hwnd):
-            title = get_window_title(hwnd)
-            if title.strip():
-                pid = get_window_pid(hwnd)
-                pname = get_process_name(pid)
-                windows.append((hwnd, title, pid, pname))
+_WIN_ACCUM: List[Tuple[int, str, int]] = []
+
+# Runs once per top-level window; globals are bound as defaults for fast local lookups.
+def _enum_windows_callback(hwnd, lparam,
+                           _IsVis=IsWindowVisible, _GetWindow=GetWindow,
+                           _GetLong=GetWindowLongW, _title=get_window_title,
+                           _GetPID=GetWindowThreadProcessId, _pid=_PID,
+                           _pid_ref=_PID_REF, _out=_WIN_ACCUM):
+    # Cheapest rejections first: hidden, owned (dialogs/popups) and tool windows.
+    if not _IsVis(hwnd):
         return True
+    if _GetWindow(hwnd, GW_OWNER):
+        return True
+    if _GetLong(hwnd, GWL_EXSTYLE) & WS_EX_TOOLWINDOW:
+        return True
+    title = _title(hwnd)
+    if title.strip():
+        _GetPID(hwnd, _pid_ref)
+        _out.append((hwnd, title, _pid.value))
+    return True
+
+# Bound once so every enumeration reuses the same ctypes thunk.
+_ENUM_WINDOWS_CB = EnumWindowsProc(_enum_windows_callback)
+
+def _resolve_process_names(pids: Set[int]) -> None:
+    """Fill _PROCESS_NAME_CACHE for the uncached PIDs in `pids`."""
+    for pid in pids - _PROCESS_NAME_CACHE.keys():
+        name = get_process_name(pid)
+        if name:  # don't pin a possibly transient failure
+            _PROCESS_NAME_CACHE[pid] = name
+
+def list_visible_windows() -> List[Tuple[int, str, int, str, str]]:
+    """Return a list of (hwnd, title, pid, process_name, sort_key) for visible top-level windows.
+
+    sort_key is the casefolded title, so callers can sort with itemgetter(4).
+    """
+    _WIN_ACCUM.clear()
+    EnumWindows(_ENUM_WINDOWS_CB, 0)
+    found = _WIN_ACCUM[:]
+    _WIN_ACCUM.clear()
+
+    seen = {pid for _, _, pid in found}
+    _resolve_process_names(seen)
+    windows = [(hwnd, title, pid, _PROCESS_NAME_CACHE.get(pid, ""), title.casefold())
+               for hwnd, title, pid in found]
 
-    EnumWindows(EnumWindowsProc(callback), 0)
+    # Forget PIDs that no longer own a window so a reused PID is re-resolved.
+    for pid in _PROCESS_NAME_CACHE.keys() - seen:
+        del _PROCESS_NAME_CACHE[pid]
     return windows
 
 def print_window_list() -> None:
     """Print visible top-level windows, marking the foreground one with '*'."""
     fg = GetForegroundWindow()
     windows = list_visible_windows()
-    windows.sort(key=lambda x: x[1].lower())
-    print("Open windows (visible, top-level). The focused one is marked with '*':\n")
-    for hwnd, title, pid, pname in windows:
+    windows.sort(key=itemgetter(4))
+    out = ["Open windows (visible, top-level). The focused one is marked with '*':\n\n"]
+    for hwnd, title, pid, pname, _ in windows:
         star = "*" if hwnd == fg else " "
         exe = f" ({pname})" if pname else ""
-        print(f"[{star}] hwnd=0x{hwnd:08X}  pid={pid}{exe}  title=\"{title}\"")
+        out.append(f"[{star}] hwnd=0x{hwnd:08X}  pid={pid}{exe}  title=\"{title}\"\n")
+    sys.stdout.write("".join(out))
+    sys.stdout.flush()
 
 __all__ = [
     "get_idle_seconds", "get_foreground_title", "get_cpu_percent", "get_net_rates",
-    "human_rate", "truncate", "print_table", "build_activity_snapshot", "print_activity_snapshot",
+    "human_rate", "truncate", "print_table",
+    "start_sampler", "build_activity_snapshot", "print_activity_snapshot",
     "get_window_title", "get_window_pid", "get_process_name", "list_visible_windows", "print_window_list",
 ]
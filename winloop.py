@@ -1,24 +1,59 @@
 # main.py
-# Poll every 5 seconds: print activity snapshot + visible windows.
+# Poll activity snapshot + visible windows, backing off while nothing changes.
 
 from time32 import *
+import sys
 import time
-import datetime
 
 POLL_SECONDS = 5
+MAX_POLL_SECONDS = 60
+
+_BAR = "=" * 80
+_DASH = "-" * 80
+
+def sleep_until_input(seconds: float) -> bool:
+    """Sleep up to `seconds`; return True early (checked every POLL_SECONDS) on new input."""
+    deadline = time.monotonic() + seconds
+    while True:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return False
+        step = min(POLL_SECONDS, remaining)
+        time.sleep(step)
+        if 0 <= get_idle_seconds() < step:
+            return True
 
 def main():
+    interval = POLL_SECONDS
+    last_hwnd = None
+    last_idle_bucket = None
+    last_listed = float("-inf")
     try:
         while True:
-            ts = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-            print("=" * 80)
-            print(f"Snapshot @ {ts}")
-            print("-" * 80)
-            print_activity_snapshot()
-            print("\n" + "-" * 80)
-            print_window_list()
-            print("=" * 80 + "\n")
-            time.sleep(POLL_SECONDS)
+            ts = time.strftime("%Y-%m-%d %H:%M:%S")
+            snapshot = build_activity_snapshot()
+            hwnd = snapshot["foreground_hwnd"]
+            idle_bucket = int(snapshot["idle_seconds"]) // 60
+            # Idle time only grows while the user is away; a lower bucket means input.
+            unchanged = (last_idle_bucket is not None and hwnd == last_hwnd
+                         and idle_bucket >= last_idle_bucket)
+            last_hwnd, last_idle_bucket = hwnd, idle_bucket
+
+            sys.stdout.write(f"{_BAR}\nSnapshot @ {ts}\n{_DASH}\n")
+            print_activity_snapshot(snapshot)
+            sys.stdout.write(f"\n{_DASH}\n")
+            now = time.monotonic()
+            if unchanged and now - last_listed < MAX_POLL_SECONDS:
+                sys.stdout.write("Foreground window unchanged; window list skipped.\n")
+            else:
+                print_window_list()
+                last_listed = now
+            sys.stdout.write(f"{_BAR}\n\n")
+            sys.stdout.flush()
+
+            interval = min(interval * 2, MAX_POLL_SECONDS) if unchanged else POLL_SECONDS
+            if sleep_until_input(interval):
+                interval = POLL_SECONDS
     except KeyboardInterrupt:
         print("\nExiting on Ctrl+C.")
 